@@ -7,5 +7,6 @@ __version__ = "0.2.1"
 from os2mo_dar_client.dar_client import AsyncDARClient
 from os2mo_dar_client.dar_client import DARClient
 from os2mo_dar_client.dar_client import AddressType
+from os2mo_dar_client.dar_client import use_uvloop
 
-__all__ = ["AsyncDARClient", "DARClient", "AddressType"]
+__all__ = ["AsyncDARClient", "DARClient", "AddressType", "use_uvloop"]
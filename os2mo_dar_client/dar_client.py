@@ -1,37 +1,105 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
 import warnings
+from asyncio import as_completed
 from asyncio import gather
+from asyncio import Semaphore
 from asyncio.exceptions import TimeoutError
-from collections import ChainMap
+from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache
 from functools import partial
 from itertools import starmap
-from operator import itemgetter
+from time import monotonic
 from types import TracebackType
 from typing import Any
 from typing import cast
-from typing import ChainMap as tChainMap
+from typing import ClassVar
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import OrderedDict as tOrderedDict
 from typing import Set
 from typing import Tuple
 from typing import Type
 from uuid import UUID
 
 import aiohttp
-from more_itertools import chunked
+import orjson
+from more_itertools import ichunked
 from more_itertools import one
-from more_itertools import unzip
 from ra_utils.syncable import Syncable
 from tenacity import retry
+from tenacity import retry_if_exception
 from tenacity import stop_after_delay
 from tenacity import wait_exponential
+from yarl import URL
 
 retry_max_time = 10
 
+# Static query parameters for lookups, pre-encoded once instead of per request
+LOOKUP_QUERY = "struktur=mini&noformat=1"
+
+
+def is_transient_error(exception: BaseException) -> bool:
+    """Check whether an exception is worth retrying.
+
+    Connection errors, timeouts and server errors are transient, while client
+    errors (such as 404) are not, and must be propagated immediately.
+
+    Args:
+        exception: The exception raised while talking to DAR.
+
+    Returns:
+        `True` if the request should be retried, `False` otherwise.
+    """
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status >= 500
+    return isinstance(exception, (aiohttp.ClientConnectionError, TimeoutError))
+
+
+@lru_cache(maxsize=None)
+def client_timeout(total: int) -> aiohttp.ClientTimeout:
+    """Construct a ClientTimeout, only once per distinct total.
+
+    Args:
+        total: Maximum waiting time for response.
+
+    Returns:
+        The ClientTimeout, shared by every call with the same total.
+    """
+    return aiohttp.ClientTimeout(total=total)
+
+
+def use_uvloop() -> None:
+    """Install uvloop as the asyncio event loop policy.
+
+    uvloop is a considerably faster drop-in replacement for the default event loop,
+    benefitting the many concurrent requests made by the clients. Must be called
+    before any event loop is created, i.e. before constructing a `DARClient`.
+
+    Example:
+        ```Python
+        from os2mo_dar_client import DARClient
+        from os2mo_dar_client import use_uvloop
+
+        if __name__ == "__main__":
+            use_uvloop()
+            darclient = DARClient()
+            with darclient:
+                print(darclient.healthcheck())
+        ```
+
+    Raises:
+        ImportError: If uvloop is not installed.
+    """
+    import uvloop
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 # TODO: Pydantic type: #45518
 AddressReply = Dict[str, Any]
 
@@ -67,6 +135,8 @@ class AddressType(str, Enum):
 
 ALL_ADDRESS_TYPES = list(AddressType)
 
+CacheKey = Tuple[AddressType, UUID]
+
 
 class AsyncDARClient:
     """Asynchronous DAR client.
@@ -83,15 +153,56 @@ class AsyncDARClient:
 
     # TODO: Query endpoints ala dawa_helper.py: #45522
     # TODO: Autocomplete endpoints ala OS2mo: #45521
-    # TODO: Caching: #45519
 
-    def __init__(self, timeout: int = 10) -> None:
+    # Sessions shared between clients constructed with `share_session`, per event
+    # loop, as a session cannot be used outside of the loop it was created in
+    _shared_sessions: ClassVar[
+        Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession]
+    ] = {}
+
+    def __init__(
+        self,
+        timeout: int = 10,
+        connector_limit: int = 100,
+        connector_limit_per_host: int = 0,
+        cache_size: int = 0,
+        max_concurrency: Optional[int] = None,
+        share_session: bool = False,
+        health_ttl: float = 5.0,
+    ) -> None:
         """Construct an async DAR client.
 
         Args:
             timeout: Maximum waiting time for response.
+            connector_limit: Maximum number of simultaneous connections.
+            connector_limit_per_host: Maximum number of simultaneous connections to
+                a single host, `0` means no limit.
+            cache_size: Maximum number of lookups to keep in the LRU cache, `0`
+                disables caching.
+            max_concurrency: Maximum number of requests in flight per `fetch` call,
+                shared between all of its address types, and likewise of calls to
+                `_address_fetched`. `None` means only bounded by the connector
+                limits.
+            share_session: Whether to share a single session, and thus connection
+                pool, between all clients constructed with this flag, per event
+                loop. The shared session is created using the connector limits of
+                the first client opening it, and must be closed using
+                `aclose_shared_session` before its event loop is closed.
+            health_ttl: Number of seconds a successful healthcheck is cached for.
         """
-        self._timeout: int = timeout
+        # Built once, as aiohttp would otherwise construct one on every request
+        self._client_timeout = client_timeout(timeout)
+        self._connector_limit: int = connector_limit
+        self._connector_limit_per_host: int = connector_limit_per_host
+        self._cache_size: int = cache_size
+        self._max_concurrency: Optional[int] = max_concurrency
+        self._share_session: bool = share_session
+        self._health_ttl: float = health_ttl
+        # Time of the last successful healthcheck, `None` if not currently healthy
+        self._healthy_at: Optional[float] = None
+        # Replies per address type and UUID, `None` marks a known missing entry.
+        # Replies are copied in and out, such that callers cannot mutate entries.
+        self._cache: tOrderedDict[CacheKey, Optional[AddressReply]] = OrderedDict()
 
         self._session: Optional[aiohttp.ClientSession] = None
         self._baseurl: str = "https://api.dataforsyningen.dk"
@@ -109,47 +220,118 @@ class AsyncDARClient:
         await self.aclose()
         return False
 
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self._connector_limit,
+            limit_per_host=self._connector_limit_per_host,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=self._client_timeout)
+
     async def aopen(self) -> None:
         if self._session:
             warnings.warn("aopen called with existing session", UserWarning)
             return
-        connector = aiohttp.TCPConnector(limit=10)
-        self._session = aiohttp.ClientSession(connector=connector)
+        if not self._share_session:
+            self._session = self._create_session()
+            return
+        shared_sessions = AsyncDARClient._shared_sessions
+        # Forget the sessions of closed event loops, as they can never be used again
+        for loop in [loop for loop in shared_sessions if loop.is_closed()]:
+            del shared_sessions[loop]
+        loop = asyncio.get_running_loop()
+        shared_session = shared_sessions.get(loop)
+        if shared_session is None or shared_session.closed:
+            shared_session = self._create_session()
+            shared_sessions[loop] = shared_session
+        self._session = shared_session
 
     async def aclose(self) -> None:
         if self._session is None:
             warnings.warn("aclose called without session", UserWarning)
             return
-        await self._session.close()
+        # The shared session outlives the client, see `aclose_shared_session`
+        if not self._share_session:
+            await self._session.close()
         self._session = None
+        self._healthy_at = None
+
+    @staticmethod
+    async def aclose_shared_session() -> None:
+        """Close the session shared between clients constructed with `share_session`.
+
+        Only the session of the running event loop is closed. Clients currently using
+        it must not be used afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        shared_session = AsyncDARClient._shared_sessions.pop(loop, None)
+        if shared_session is None:
+            return
+        await shared_session.close()
 
     def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None:
             raise ValueError("Session not set")
         return self._session
 
-    async def healthcheck(self, timeout: Optional[int] = None) -> bool:
-        """Check whether DAR can be reached
+    async def _probe(self, url: str, timeout: aiohttp.ClientTimeout) -> bool:
+        """Check whether a single DAR endpoint can be reached.
 
         Args:
-            timeout: Maximum waiting time for response, defaults to class timeout.
+            url: The endpoint to probe.
+            timeout: Maximum waiting time for response.
 
         Returns:
             `True` if reachable, `False` otherwise.
         """
-        url = f"{self._baseurl}/autocomplete"
         try:
-            async with self._get_session().get(
-                url, timeout=timeout or self._timeout
-            ) as response:
-                if response.status == 200:
-                    return True
-                return False
+            async with self._get_session().get(url, timeout=timeout) as response:
+                return response.status == 200
         except aiohttp.ClientError:
             return False
         except TimeoutError:
             return False
 
+    async def healthcheck(
+        self,
+        timeout: Optional[int] = None,
+        addrtypes: Optional[List[AddressType]] = None,
+    ) -> bool:
+        """Check whether DAR can be reached
+
+        Successful checks are cached for `health_ttl` seconds, failed ones are not.
+        Checks including addrtypes are never cached.
+
+        Args:
+            timeout: Maximum waiting time for response, defaults to class timeout.
+            addrtypes: Address type endpoints to probe, in parallel, in addition to
+                the autocomplete endpoint. If `None` only autocomplete is probed.
+
+        Returns:
+            `True` if all probed endpoints are reachable, `False` otherwise.
+        """
+        if (
+            not addrtypes
+            and self._healthy_at is not None
+            and monotonic() - self._healthy_at < self._health_ttl
+        ):
+            return True
+        self._healthy_at = None
+
+        urls = [f"{self._baseurl}/autocomplete"]
+        urls.extend(
+            f"{self._baseurl}/{addrtype.value}?{LOOKUP_QUERY}&per_side=1"
+            for addrtype in addrtypes or []
+        )
+        probe_timeout = self._client_timeout
+        if timeout:
+            probe_timeout = client_timeout(timeout)
+        probes = map(partial(self._probe, timeout=probe_timeout), urls)
+        healthy = all(await gather(*probes))
+        if healthy and not addrtypes:
+            self._healthy_at = monotonic()
+        return healthy
+
     async def _cleanse_single(
         self, address_string: str, addrtype: AddressType
     ) -> AddressReply:
@@ -180,10 +362,10 @@ class AsyncDARClient:
         params = {"betegnelse": address_string}
 
         async with self._get_session().get(
-            url, params=params, timeout=self._timeout
+            url, params=params, timeout=self._client_timeout
         ) as response:
             response.raise_for_status()
-            payload = await response.json()
+            payload = orjson.loads(await response.read())
             # Check match category:
             # A is a near perfect match,
             # B is a unique match,
@@ -193,76 +375,149 @@ class AsyncDARClient:
             address = one(payload["resultater"])["adresse"]
             return cast(AddressReply, address)
 
-    # TODO: Caching goes in here
+    def _cache_lookup(
+        self, uuids: Set[UUID], addrtype: AddressType
+    ) -> Tuple[Dict[UUID, AddressReply], Set[UUID], Set[UUID]]:
+        """Lookup uuids in the cache.
+
+        Args:
+            uuids: List of DAR UUIDs to lookup.
+            addrtype: The address type to lookup.
+
+        Returns:
+            * dict: Map from UUID to a fresh copy of the cached DAR reply.
+            * set: Set of UUIDs of entries cached as not found.
+            * set: Set of UUIDs of entries which are not in the cache.
+        """
+        if not self._cache:
+            return dict(), set(), uuids
+
+        result: Dict[UUID, AddressReply] = {}
+        missing: Set[UUID] = set()
+        uncached: Set[UUID] = set()
+        for uuid in uuids:
+            key = (addrtype, uuid)
+            if key not in self._cache:
+                uncached.add(uuid)
+                continue
+            self._cache.move_to_end(key)
+            reply = self._cache[key]
+            if reply is None:
+                missing.add(uuid)
+            else:
+                # Replies are flat (struktur=mini), thus a shallow copy suffices
+                result[uuid] = dict(reply)
+        return result, missing, uncached
+
+    def _cache_update(
+        self,
+        addrtype: AddressType,
+        result: Dict[UUID, AddressReply],
+        missing: Set[UUID],
+    ) -> None:
+        """Insert lookup results into the cache, evicting the least recently used.
+
+        Args:
+            addrtype: The address type which was looked up.
+            result: Map from UUID to DAR reply.
+            missing: Set of UUIDs of entries which were not found.
+        """
+        if self._cache_size <= 0:
+            return
+
+        entries: Dict[UUID, Optional[AddressReply]] = dict.fromkeys(missing)
+        entries.update((uuid, dict(reply)) for uuid, reply in result.items())
+        for uuid, reply in entries.items():
+            key = (addrtype, uuid)
+            self._cache[key] = reply
+            self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
     async def _address_fetched(self, uuid: UUID, reply: Dict[str, Any]) -> None:
-        pass
+        """Hook called for every address fetched, does nothing by default.
 
-    @retry(
-        reraise=True,
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        stop=stop_after_delay(retry_max_time),
-    )
-    async def _fetch_single(self, uuid: UUID, addrtype: AddressType) -> AddressReply:
-        """Lookup uuid in DAR.
+        During `fetch` the hook is called per chunk of the first address type as soon
+        as its reply arrives. UUIDs found in the fallback address types are passed
+        once all of these have been merged, thus only with the reply taking priority.
 
         Args:
             uuid: DAR UUID.
-            addrtypes: The address type to lookup.
+            reply: DAR reply.
+        """
 
-        Raises:
-            aiohttp.ClientResponseError: If anything goes wrong
+    async def _addresses_fetched(
+        self, result: Dict[UUID, AddressReply], semaphore: Semaphore
+    ) -> None:
+        """Call `_address_fetched` for each entry in result.
 
-        Returns:
-            * dict: DAR Reply
+        Skipped entirely unless `_address_fetched` is overridden, as the default
+        implementation does nothing.
+
+        Args:
+            result: Map from UUID to DAR reply.
+            semaphore: Bounds the number of calls in flight.
         """
+        if type(self)._address_fetched is AsyncDARClient._address_fetched:
+            return
 
-        url = f"{self._baseurl}/{addrtype.value}/{str(uuid)}"
-        params = {"struktur": "mini", "noformat": 1}
+        async def address_fetched(uuid: UUID, reply: AddressReply) -> None:
+            async with semaphore:
+                await self._address_fetched(uuid, reply)
 
-        async with self._get_session().get(
-            url, params=params, timeout=self._timeout
-        ) as response:
-            response.raise_for_status()
-            payload = await response.json()
-            return cast(AddressReply, payload)
+        await gather(*starmap(address_fetched, result.items()))
 
     @retry(
         reraise=True,
         wait=wait_exponential(multiplier=1, min=4, max=10),
         stop=stop_after_delay(retry_max_time),
+        retry=retry_if_exception(is_transient_error),
     )
     async def _fetch_non_chunked(
-        self, uuids: Set[UUID], addrtype: AddressType
+        self, uuids: Set[UUID], addrtype: AddressType, uuid_strings: Dict[UUID, str]
     ) -> Tuple[Dict[UUID, AddressReply], Set[UUID]]:
         """Lookup uuids in DAR (no chunking).
 
         Args:
             uuids: List of DAR UUIDs to lookup.
             addrtype: The address type to lookup.
+            uuid_strings: Map from UUID to its string representation.
 
         Returns:
             * dict: Map from UUID to DAR reply.
             * set: Set of UUIDs of entries which were not found.
         """
-        url = f"{self._baseurl}/{addrtype.value}"
-        params = {"id": "|".join(map(str, uuids)), "struktur": "mini", "noformat": 1}
+        # UUIDs and the separator are all URL-safe, thus we build the URL as already
+        # encoded, avoiding aiohttp percent-encoding every '|' as '%7C'
+        # Map replies back to the UUID objects we were given, instead of parsing and
+        # hashing new UUID objects for every reply
+        id_uuids = {uuid_strings[uuid]: uuid for uuid in uuids}
+        ids = "|".join(id_uuids)
+        url = URL(
+            f"{self._baseurl}/{addrtype.value}?{LOOKUP_QUERY}&id={ids}", encoded=True
+        )
 
         async with self._get_session().get(
-            url, params=params, timeout=self._timeout
+            url, timeout=self._client_timeout
         ) as response:
             response.raise_for_status()
-            body = await response.json()
-
-            result_uuids = map(UUID, map(itemgetter("id"), body))
-            result = dict(zip(result_uuids, body))
-
-            found_uuids = result.keys()
-            missing = set(uuids) - found_uuids
+            body = orjson.loads(await response.read())
 
+            result = {
+                id_uuids.get(address["id"]) or UUID(address["id"]): address
+                for address in body
+            }
+            missing = uuids - result.keys()
             return result, missing
 
     async def _fetch_chunked(
-        self, uuids: Set[UUID], addrtype: AddressType, chunk_size: int
+        self,
+        uuids: Set[UUID],
+        addrtype: AddressType,
+        chunk_size: int,
+        uuid_strings: Dict[UUID, str],
+        semaphore: Semaphore,
+        hook_semaphore: Optional[Semaphore],
     ) -> Tuple[Dict[UUID, AddressReply], Set[UUID]]:
         """Lookup uuids in DAR (chunked).
 
@@ -272,27 +527,48 @@ class AsyncDARClient:
             uuids: List of DAR UUIDs.
             addrtype: The address type to lookup.
             chunk_size: Number of UUIDs per block, sent to DAR.
+            uuid_strings: Map from UUID to its string representation.
+            semaphore: Bounds the number of chunks in flight.
+            hook_semaphore: Bounds the `_address_fetched` calls for each chunk, if
+                `None` the hook is not called.
 
         Returns:
             * dict: Map from UUID to DAR reply.
             * set: Set of UUIDs of entries which were not found.
         """
 
-        # Chunk our UUIDs into blocks of chunk_size
-        uuid_chunks = chunked(uuids, chunk_size)
-        # Convert chunks into a list of asyncio.tasks
-        tasks = map(partial(self._fetch_non_chunked, addrtype=addrtype), uuid_chunks)
-        # Here 'result' is a list of tuples (dict, set) => (result, missing)
-        result = await gather(*tasks)
-        # First we unzip 'result' to get a list of results and a list of missing
-        result_dicts, missing_sets = unzip(result)
-        # Then we union the dicts and sets before returning
-        combined_result = dict(ChainMap(*result_dicts))
-        combined_missing = set.union(*missing_sets)
+        async def fetch_chunk(
+            chunk: Set[UUID],
+        ) -> Tuple[Dict[UUID, AddressReply], Set[UUID]]:
+            async with semaphore:
+                result, missing = await self._fetch_non_chunked(
+                    chunk, addrtype, uuid_strings
+                )
+            # Let the hook process this chunk while the other chunks are in flight
+            if hook_semaphore is not None:
+                await self._addresses_fetched(result, hook_semaphore)
+            return result, missing
+
+        # Chunk our UUIDs into sets of chunk_size and convert them into coroutines
+        tasks = [fetch_chunk(set(chunk)) for chunk in ichunked(uuids, chunk_size)]
+        # Fold each chunk into the combined result as soon as it arrives, such that
+        # a single slow chunk does not keep every other chunk reply alive
+        combined_result: Dict[UUID, AddressReply] = {}
+        combined_missing: Set[UUID] = set()
+        for task in as_completed(tasks):
+            result, missing = await task
+            combined_result.update(result)
+            combined_missing |= missing
         return combined_result, combined_missing
 
     async def _fetch(
-        self, uuids: Set[UUID], addrtype: AddressType, chunk_size: int
+        self,
+        uuids: Set[UUID],
+        addrtype: AddressType,
+        chunk_size: int,
+        uuid_strings: Dict[UUID, str],
+        semaphore: Semaphore,
+        hook_semaphore: Optional[Semaphore] = None,
     ) -> Tuple[Dict[UUID, AddressReply], Set[UUID]]:
         """Lookup uuids in DAR (chunked if required).
 
@@ -300,21 +576,42 @@ class AsyncDARClient:
             uuids: List of DAR UUIDs.
             addrtype: The address type to lookup.
             chunk_size: Number of UUIDs per block, sent to DAR.
+            uuid_strings: Map from UUID to its string representation.
+            semaphore: Bounds the number of requests in flight.
+            hook_semaphore: Bounds the `_address_fetched` calls for the replies, if
+                `None` the hook is not called.
 
         Returns:
             * dict: Map from UUID to DAR reply.
             * set: Set of UUIDs of entries which were not found.
         """
+        cached, cached_missing, uuids = self._cache_lookup(uuids, addrtype)
+
+        result: Dict[UUID, AddressReply]
+        missing: Set[UUID]
         num_uuids = len(uuids)
         # Short-circuit if possible, chunk if required
         if num_uuids == 0:
-            return dict(), set()
-        if num_uuids <= chunk_size:
-            res: Tuple[
-                Dict[UUID, AddressReply], Set[UUID]
-            ] = await self._fetch_non_chunked(uuids, addrtype)
-            return res
-        return await self._fetch_chunked(uuids, addrtype, chunk_size)
+            result, missing = dict(), set()
+        elif num_uuids <= chunk_size:
+            async with semaphore:
+                result, missing = await self._fetch_non_chunked(
+                    uuids, addrtype, uuid_strings
+                )
+            if hook_semaphore is not None:
+                await self._addresses_fetched(result, hook_semaphore)
+        else:
+            # Calls `_addresses_fetched` per chunk
+            result, missing = await self._fetch_chunked(
+                uuids, addrtype, chunk_size, uuid_strings, semaphore, hook_semaphore
+            )
+        self._cache_update(addrtype, result, missing)
+        if hook_semaphore is not None:
+            await self._addresses_fetched(cached, hook_semaphore)
+
+        result.update(cached)
+        missing |= cached_missing
+        return result, missing
 
     async def fetch(
         self,
@@ -327,7 +624,8 @@ class AsyncDARClient:
     ) -> Tuple[Dict[UUID, AddressReply], Set[UUID]]:
         """Lookup uuids in DAR (chunked if necessary).
 
-        Calls `_fetch` with all the provided addrtypes.
+        Calls `_fetch` with the first of the provided addrtypes, and then with the
+        remaining addrtypes in parallel for the UUIDs which were not found.
 
         Args:
             uuids: List of DAR UUIDs.
@@ -339,52 +637,68 @@ class AsyncDARClient:
             * set: Set of UUIDs of entries which were not found.
         """
         addrtypes = addrtypes or ALL_ADDRESS_TYPES
-        combined_result: tChainMap[UUID, AddressReply] = ChainMap({})
-        # TODO: Do all 4 in parallel?
-        for addrtype in addrtypes:
-            result, missing = await self._fetch(uuids, addrtype, chunk_size=chunk_size)
-            combined_result = ChainMap(combined_result, result)
-            # If we managed to find everything, there is no need to check the remaining
-            # address types, we can simply return our findings
-            if not missing:
-                break
-            # We only need to check the missing UUIDs in the remaining address types
-            uuids = missing
-        final_result = dict(combined_result)
-        await gather(*starmap(self._address_fetched, final_result.items()))
-        return final_result, missing
+        primary_addrtype, *fallback_addrtypes = addrtypes
+        # Stringify our UUIDs once, rather than once per address type
+        uuid_strings = {uuid: str(uuid) for uuid in uuids}
+        # Bound the number of requests in flight for this lookup, across all address
+        # types, such that a single large lookup cannot occupy every connection in
+        # the connector. Unbounded, each address type sends at most one per UUID.
+        semaphore = Semaphore(self._max_concurrency or len(uuids) * len(addrtypes))
+        # Bound the number of `_address_fetched` calls in flight for this lookup
+        hook_semaphore = Semaphore(self._max_concurrency or len(uuids))
+        result, missing = await self._fetch(
+            uuids, primary_addrtype, chunk_size, uuid_strings, semaphore, hook_semaphore
+        )
+        # Most UUIDs are usually found in the primary address type, thus we only
+        # check the missing UUIDs in the remaining address types. These are checked
+        # in parallel, trading a few redundant requests for a single round-trip.
+        if missing and fallback_addrtypes:
+            tasks = map(
+                partial(
+                    self._fetch,
+                    missing,
+                    chunk_size=chunk_size,
+                    uuid_strings=uuid_strings,
+                    semaphore=semaphore,
+                ),
+                fallback_addrtypes,
+            )
+            results = await gather(*tasks)
+            # Earlier address types take priority, thus only the first reply is kept
+            fallback_result: Dict[UUID, AddressReply] = {}
+            for address_result, _ in results:
+                for uuid, reply in address_result.items():
+                    fallback_result.setdefault(uuid, reply)
+            # Only the replies taking priority are passed to the hook
+            await self._addresses_fetched(fallback_result, hook_semaphore)
+            result.update(fallback_result)
+            # A UUID is only missing if it was missing from every address type
+            missing = missing - fallback_result.keys()
+        return result, missing
 
     async def fetch_single(
         self, uuid: UUID, addrtypes: Optional[List[AddressType]] = None
     ) -> AddressReply:
         """Lookup uuid in DAR.
 
-        Calls `_fetch_single` with all the provided addrtypes.
+        Calls `fetch` with the single UUID, thus looking up the fallback addrtypes in
+        parallel, rather than probing them one at a time.
 
         Args:
             uuid: DAR UUID.
             addrtypes: The address type(s) to lookup. If `None` all 4 types are checked.
 
         Raises:
+            aiohttp.ClientResponseError: If anything goes wrong.
             ValueError: If no match could be found
 
         Returns:
             * dict: DAR Reply
         """
-        addrtypes = addrtypes or ALL_ADDRESS_TYPES
-        # TODO: Do all 4 in parallel?
-        for addrtype in addrtypes:
-            try:
-                payload: AddressReply = await self._fetch_single(uuid, addrtype)
-                # If we get here everything went well
-                await self._address_fetched(uuid, payload)
-                return payload
-            except aiohttp.ClientResponseError as exc:
-                # If not found, try the next address type
-                if exc.status == 404:
-                    continue
-                raise exc
-        raise ValueError("No address match found in DAR")
+        result, _ = await self.fetch({uuid}, addrtypes)
+        if uuid not in result:
+            raise ValueError("No address match found in DAR")
+        return result[uuid]
 
     async def cleanse_single(
         self, address_string: str, addrtypes: Optional[List[AddressType]] = None
@@ -438,6 +752,10 @@ class DARClient(Syncable, AsyncDARClient):
             ```
 
     Is implemented atop the `AsyncDARClient` using `ra_utils.Syncable`.
+
+    `Syncable` binds an event loop on construction and reuses it for every
+    synchronous call, thus a client should be constructed once and reused, rather
+    than constructed per call.
     """
 
     pass
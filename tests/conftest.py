@@ -1,8 +1,35 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+from typing import List
+
+import pytest
+import pytest_asyncio
+
 from .utils import adarclient
 from .utils import darclient
+from .utils import darconnector
 from .utils import darserver
+from .utils import event_loop_policy
+from .utils import reset_dar_requests
+
+__all__ = [
+    "adarclient",
+    "darclient",
+    "darconnector",
+    "darserver",
+    "event_loop_policy",
+    "reset_dar_requests",
+]
+
+
+def pytest_collection_modifyitems(items: List[pytest.Item]) -> None:
+    """Run every async test in the session-scoped event loop.
 
-__all__ = ["adarclient", "darclient", "darserver"]
+    This matches the loop scope of our fixtures, such that the session-scoped mock
+    DAR app and the tests share a single event loop.
+    """
+    session_scope_marker = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_scope_marker, append=False)
@@ -1,17 +1,31 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+from asyncio import sleep
+from asyncio.exceptions import TimeoutError
 from functools import partial
+from typing import Any
+from typing import Awaitable
+from typing import Callable
 from unittest.mock import MagicMock
+from uuid import uuid4
 
 import pytest
+from aiohttp import ClientConnectionError
+from aiohttp import ClientError
 from aiohttp import ClientResponseError
+from tenacity import stop_after_attempt
+from tenacity import wait_none
 
 from .utils import assert_dar_response
 from .utils import dar_lookup
 from .utils import dar_non_existent
 from .utils import dar_parameterize
+from .utils import dar_requests
+from os2mo_dar_client import AddressType
 from os2mo_dar_client import AsyncDARClient
+from os2mo_dar_client.dar_client import ALL_ADDRESS_TYPES
+from os2mo_dar_client.dar_client import is_transient_error
 
 
 @pytest.mark.parametrize(*dar_parameterize)
@@ -43,7 +57,7 @@ async def test_dar_fetch(adarclient: AsyncDARClient, uuid, expected):
 
 
 @pytest.mark.parametrize("uuid", dar_non_existent)
-async def test_dar_fetch_non_existent(adarclient: AsyncDARClient, uuid, loop):
+async def test_dar_fetch_non_existent(adarclient: AsyncDARClient, uuid):
     """Test lookup of single non-existent entry using dar_fetch fails."""
     async with adarclient:
         results, missing = await adarclient.fetch({uuid})
@@ -116,16 +130,16 @@ async def test_dar_fetch_single_clientresponse_error(adarclient: AsyncDARClient)
     )
     uuid = next(iter(dar_non_existent))
 
-    # 404 are retried as next type
-    with pytest.raises(ValueError) as excinfo1:
+    # Non-existent entries are not reported using errors, thus even 404s are
+    # propagated as-is
+    with pytest.raises(ClientResponseError) as excinfo1:
         async with adarclient:
             adarclient._get_session().get = MagicMock(  # type: ignore
                 side_effect=SeededClientResponseError(status=404)
             )
             await adarclient.fetch_single(uuid)
-        assert "No address match found in DAR" in str(excinfo1.value)
+        assert "BOOM" in str(excinfo1.value)
 
-    # All others are propagated as-is
     with pytest.raises(ClientResponseError) as excinfo2:
         async with adarclient:
             adarclient._get_session().get = MagicMock(  # type: ignore
@@ -133,3 +147,302 @@ async def test_dar_fetch_single_clientresponse_error(adarclient: AsyncDARClient)
             )
             await adarclient.fetch_single(uuid)
         assert "BOOM" in str(excinfo2.value)
+
+
+@pytest.mark.parametrize(
+    "exception,expected",
+    [
+        (ClientResponseError(None, None, status=404), False),  # type: ignore
+        (ClientResponseError(None, None, status=503), True),  # type: ignore
+        (ClientConnectionError("BOOM"), True),
+        (TimeoutError(), True),
+        (ValueError("BOOM"), False),
+    ],
+)
+def test_is_transient_error(exception, expected):
+    """Test that only connection errors, timeouts and 5xx are retried."""
+    assert is_transient_error(exception) is expected
+
+
+async def test_dar_fetch_client_error_not_retried(adarclient: AsyncDARClient):
+    """Test that client errors are propagated without retrying."""
+
+    SeededClientResponseError = partial(
+        ClientResponseError, history=None, request_info=None
+    )
+
+    with pytest.raises(ClientResponseError):
+        async with adarclient:
+            get = adarclient._get_session().get = MagicMock(  # type: ignore
+                side_effect=SeededClientResponseError(status=400)
+            )
+            await adarclient.fetch(dar_non_existent, [AddressType.ADDRESS])
+    assert get.call_count == 1
+
+
+async def test_dar_fetch_server_error_retried(adarclient: AsyncDARClient, monkeypatch):
+    """Test that server errors are retried before being propagated."""
+
+    SeededClientResponseError = partial(
+        ClientResponseError, history=None, request_info=None
+    )
+    retrying = AsyncDARClient._fetch_non_chunked.retry  # type: ignore
+    monkeypatch.setattr(retrying, "wait", wait_none())
+    monkeypatch.setattr(retrying, "stop", stop_after_attempt(3))
+
+    with pytest.raises(ClientResponseError):
+        async with adarclient:
+            get = adarclient._get_session().get = MagicMock(  # type: ignore
+                side_effect=SeededClientResponseError(status=503)
+            )
+            await adarclient.fetch(dar_non_existent, [AddressType.ADDRESS])
+    assert get.call_count == 3
+
+
+async def test_dar_fetch_cached(adarclient: AsyncDARClient):
+    """Test that repeated lookups using dar_fetch are served from the cache."""
+    adarclient._cache_size = 100
+    uuids = set.union(dar_non_existent, set(dar_lookup.keys()))
+    async with adarclient:
+        await adarclient.fetch(uuids)
+        get = adarclient._get_session().get = MagicMock(  # type: ignore
+            side_effect=ClientError("BOOM")
+        )
+        results, missing = await adarclient.fetch(uuids)
+    assert get.call_count == 0
+    assert missing == dar_non_existent
+    assert len(results) == len(dar_lookup)
+    for uuid, expected in dar_lookup.items():
+        result = results[uuid]
+        assert_dar_response(result, expected)
+
+
+async def test_dar_fetch_cached_copies(adarclient: AsyncDARClient):
+    """Test that mutating a lookup result does not alter the cached entry."""
+    adarclient._cache_size = 100
+    uuid, expected = next(iter(dar_lookup.items()))
+    async with adarclient:
+        result = await adarclient.fetch_single(uuid)
+        result["vejnavn"] = "BOOM"
+        cached = await adarclient.fetch_single(uuid)
+        cached["husnr"] = "BOOM"
+        result = await adarclient.fetch_single(uuid)
+    assert_dar_response(result, expected)
+
+
+async def test_dar_fetch_single_cached(adarclient: AsyncDARClient):
+    """Test that repeated lookups using dar_fetch_single are served from the cache."""
+    adarclient._cache_size = 100
+    uuid, expected = next(iter(dar_lookup.items()))
+    non_existent = next(iter(dar_non_existent))
+    async with adarclient:
+        await adarclient.fetch_single(uuid)
+        with pytest.raises(ValueError):
+            await adarclient.fetch_single(non_existent)
+        get = adarclient._get_session().get = MagicMock(  # type: ignore
+            side_effect=ClientError("BOOM")
+        )
+        result = await adarclient.fetch_single(uuid)
+        with pytest.raises(ValueError) as excinfo:
+            await adarclient.fetch_single(non_existent)
+        assert "No address match found in DAR" in str(excinfo.value)
+    assert get.call_count == 0
+    assert_dar_response(result, expected)
+
+
+async def test_dar_fetch_cache_eviction(adarclient: AsyncDARClient):
+    """Test that the cache evicts the least recently used entries."""
+    adarclient._cache_size = 1
+    first, second = dar_lookup.keys()
+    async with adarclient:
+        await adarclient.fetch_single(first, [AddressType.ADDRESS])
+        await adarclient.fetch_single(second, [AddressType.ADDRESS])
+    assert list(adarclient._cache.keys()) == [(AddressType.ADDRESS, second)]
+
+
+async def test_dar_fetch_single_addrtype(adarclient: AsyncDARClient):
+    """Test lookup of mixed-existent entries in a single address type."""
+    async with adarclient:
+        results, missing = await adarclient.fetch(
+            set.union(dar_non_existent, set(dar_lookup.keys())),
+            [AddressType.ADDRESS],
+        )
+    assert missing == dar_non_existent
+    assert len(results) == len(dar_lookup)
+    for uuid, expected in dar_lookup.items():
+        result = results[uuid]
+        assert_dar_response(result, expected)
+
+
+async def test_dar_fetch_ids_not_encoded(adarclient: AsyncDARClient):
+    """Test that the UUID separator is sent to DAR without percent-encoding."""
+    first, second = dar_lookup.keys()
+    with pytest.raises(ClientError):
+        async with adarclient:
+            get = adarclient._get_session().get = MagicMock(  # type: ignore
+                side_effect=ClientError("BOOM")
+            )
+            await adarclient.fetch({first, second}, [AddressType.ADDRESS])
+    url = get.call_args.args[0]
+    assert "%7C" not in url.raw_query_string
+    assert url.raw_query_string.count("|") == 1
+    assert url.query["id"] in (f"{first}|{second}", f"{second}|{first}")
+
+
+class InFlightTracker:
+    """Wrap a coroutine function, tracking the peak number of its calls in flight."""
+
+    def __init__(self, func: Callable[..., Awaitable[Any]], delay: float = 0):
+        self.func = func
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await sleep(self.delay)
+            return await self.func(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.parametrize("max_concurrency,expected_peak", [(None, 2), (1, 1)])
+async def test_dar_fetch_max_concurrency(
+    adarclient: AsyncDARClient, max_concurrency, expected_peak
+):
+    """Test that max_concurrency bounds the number of chunks in flight."""
+    adarclient._max_concurrency = max_concurrency
+    tracker = InFlightTracker(adarclient._fetch_non_chunked)
+    adarclient._fetch_non_chunked = tracker  # type: ignore
+    async with adarclient:
+        results, missing = await adarclient.fetch(
+            set(dar_lookup.keys()), [AddressType.ADDRESS], chunk_size=1
+        )
+    assert not missing
+    assert len(results) == len(dar_lookup)
+    assert tracker.peak == expected_peak
+
+
+async def test_dar_fetch_max_concurrency_fallback(adarclient: AsyncDARClient):
+    """Test that max_concurrency is shared between the fallback address types."""
+    adarclient._max_concurrency = 2
+    tracker = InFlightTracker(adarclient._fetch_non_chunked)
+    adarclient._fetch_non_chunked = tracker  # type: ignore
+    async with adarclient:
+        results, missing = await adarclient.fetch(dar_non_existent, chunk_size=1)
+    assert not results
+    assert missing == dar_non_existent
+    assert tracker.peak == 2
+
+
+@pytest.mark.parametrize("addrtypes", [None, [AddressType.ADDRESS]])
+@pytest.mark.parametrize("chunk_size", [1, 100])
+async def test_dar_fetch_address_fetched(
+    adarclient: AsyncDARClient, monkeypatch, addrtypes, chunk_size
+):
+    """Test that an overridden _address_fetched is called for each result."""
+    fetched = {}
+
+    async def address_fetched(self, uuid, reply):
+        fetched[uuid] = reply
+
+    monkeypatch.setattr(type(adarclient), "_address_fetched", address_fetched)
+    adarclient._max_concurrency = 1
+    async with adarclient:
+        results, _ = await adarclient.fetch(
+            set.union(dar_non_existent, set(dar_lookup.keys())),
+            addrtypes,
+            chunk_size=chunk_size,
+        )
+    assert fetched == results
+    assert fetched.keys() == dar_lookup.keys()
+
+
+async def test_dar_fetch_address_fetched_max_concurrency(
+    adarclient: AsyncDARClient, monkeypatch
+):
+    """Test that max_concurrency bounds _address_fetched calls across chunks."""
+    # Each call outlasts the request of the next chunk
+    tracker = InFlightTracker(
+        partial(AsyncDARClient._address_fetched, adarclient), 0.05
+    )
+    monkeypatch.setattr(type(adarclient), "_address_fetched", tracker)
+    adarclient._max_concurrency = 1
+    async with adarclient:
+        results, _ = await adarclient.fetch(
+            set(dar_lookup.keys()), [AddressType.ADDRESS], chunk_size=1
+        )
+    assert len(results) == len(dar_lookup)
+    assert tracker.peak == 1
+
+
+async def test_dar_fetch_fallback_only_missing(adarclient: AsyncDARClient):
+    """Test that only UUIDs missing from the first address type are looked up again."""
+    fetch_non_chunked = adarclient._fetch_non_chunked
+    lookups = []
+
+    async def tracking_fetch_non_chunked(uuids, addrtype, *args, **kwargs):
+        lookups.append((addrtype, uuids))
+        return await fetch_non_chunked(uuids, addrtype, *args, **kwargs)
+
+    adarclient._fetch_non_chunked = tracking_fetch_non_chunked  # type: ignore
+    uuids = set.union(dar_non_existent, set(dar_lookup.keys()))
+    async with adarclient:
+        results, missing = await adarclient.fetch(uuids)
+    assert missing == dar_non_existent
+    assert results.keys() == dar_lookup.keys()
+
+    primary_lookup, *fallback_lookups = lookups
+    assert primary_lookup == (AddressType.ADDRESS, uuids)
+    assert sorted(addrtype for addrtype, _ in fallback_lookups) == sorted(
+        ALL_ADDRESS_TYPES[1:]
+    )
+    for _, fallback_uuids in fallback_lookups:
+        assert fallback_uuids == dar_non_existent
+
+
+async def test_dar_fetch_fallback_priority(adarclient: AsyncDARClient, monkeypatch):
+    """Test that earlier fallback address types take priority, also in the hook."""
+    fetched = []
+
+    async def address_fetched(self, uuid, reply):
+        fetched.append((uuid, reply))
+
+    async def fetch_non_chunked(uuids, addrtype, *args, **kwargs):
+        if addrtype == AddressType.ADDRESS:
+            return {}, set(uuids)
+        return {uuid: {"addrtype": addrtype} for uuid in uuids}, set()
+
+    monkeypatch.setattr(type(adarclient), "_address_fetched", address_fetched)
+    adarclient._fetch_non_chunked = fetch_non_chunked  # type: ignore
+    uuids = set(dar_lookup.keys())
+    async with adarclient:
+        results, missing = await adarclient.fetch(uuids, chunk_size=1)
+    assert not missing
+    assert results == {uuid: {"addrtype": AddressType.ACCESS_ADDRESS} for uuid in uuids}
+    # _address_fetched is called once per UUID, with the reply taking priority
+    assert len(fetched) == len(uuids)
+    assert dict(fetched) == results
+
+
+async def test_dar_fetch_non_chunked_id_formatting(adarclient: AsyncDARClient):
+    """Test that replies are mapped back to UUIDs regardless of id formatting."""
+    uuid, expected = next(iter(dar_lookup.items()))
+    async with adarclient:
+        results, missing = await adarclient._fetch_non_chunked(
+            {uuid}, AddressType.ADDRESS, {uuid: str(uuid).upper()}
+        )
+    assert not missing
+    assert_dar_response(results[uuid], expected)
+
+
+async def test_dar_fetch_batched(adarclient: AsyncDARClient):
+    """Test that a bulk lookup is sent to DAR as a single multi-id request."""
+    uuids = set(dar_lookup.keys()) | {uuid4() for _ in range(50 - len(dar_lookup))}
+    async with adarclient:
+        results, missing = await adarclient.fetch(uuids, [AddressType.ADDRESS])
+    assert dar_requests == {f"/{AddressType.ADDRESS.value}": 1}
+    assert results.keys() == dar_lookup.keys()
+    assert missing == uuids - dar_lookup.keys()
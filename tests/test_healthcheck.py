@@ -2,7 +2,13 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 from asyncio import sleep
+from asyncio.exceptions import TimeoutError
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any
+from typing import Iterator
 from unittest.mock import MagicMock
+from unittest.mock import patch
 from warnings import catch_warnings
 
 import pytest
@@ -10,7 +16,10 @@ from aiohttp import ClientError
 from aiohttp import web
 from more_itertools import first
 
-from .utils import darclient_mock
+from .utils import adarclient_mock
+from .utils import dar_requests
+from os2mo_dar_client import AddressType
+from os2mo_dar_client import AsyncDARClient
 from os2mo_dar_client import DARClient
 
 
@@ -38,28 +47,28 @@ def test_healthcheck_sync(darclient: DARClient):
     assert darclient._session is None
 
 
-async def test_healthcheck_async(darclient: DARClient, loop):
+async def test_healthcheck_async(adarclient: AsyncDARClient):
     result = False
 
-    assert darclient._session is None
+    assert adarclient._session is None
     with pytest.raises(ValueError) as excinfo:
-        await darclient.healthcheck()
+        await adarclient.healthcheck()
     assert "Session not set" in str(excinfo)
 
-    assert darclient._session is None
-    async with darclient:
-        assert darclient._session is not None
-        result = await darclient.healthcheck()
+    assert adarclient._session is None
+    async with adarclient:
+        assert adarclient._session is not None
+        result = await adarclient.healthcheck()
     assert result is True
-    assert darclient._session is None
+    assert adarclient._session is None
 
-    assert darclient._session is None
-    await darclient.aopen()
-    assert darclient._session is not None
-    result = await darclient.healthcheck()
-    await darclient.aclose()
+    assert adarclient._session is None
+    await adarclient.aopen()
+    assert adarclient._session is not None
+    result = await adarclient.healthcheck()
+    await adarclient.aclose()
     assert result is True
-    assert darclient._session is None
+    assert adarclient._session is None
 
 
 def test_multiple_call_warnings():
@@ -90,58 +99,112 @@ def test_multiple_call_warnings():
         assert "aclose called without session" in str(warning.message)
 
 
-async def test_healthcheck_non_200(aiohttp_client, loop):
-    # Non-200 status code
-    status = {"entered": False}
+@contextmanager
+def patch_get(
+    adarclient: AsyncDARClient, status: int = 200, **kwargs: Any
+) -> Iterator[MagicMock]:
+    """Patch session.get to reply with status, without an HTTP round-trip."""
+    with patch.object(adarclient._get_session(), "get", **kwargs) as get:
+        get.return_value.__aenter__.return_value.status = status
+        yield get
 
-    async def autocomplete_fail(request):
-        status["entered"] = True
-        raise web.HTTPInternalServerError()
 
-    app = web.Application()
-    app.router.add_get("/autocomplete", autocomplete_fail)
-    darclient = await darclient_mock(aiohttp_client, app)
-    async with darclient:
-        result = await darclient.healthcheck()
+async def test_healthcheck_non_200():
+    # Non-200 status code
+    async with AsyncDARClient() as adarclient:
+        with patch_get(adarclient, status=500) as get:
+            result = await adarclient.healthcheck()
     assert result is False
-    assert status["entered"] is True
+    assert get.call_count == 1
 
 
-async def test_healthcheck_timeout(aiohttp_client, loop):
+async def test_healthcheck_timeout():
     # Timeout
-    status = {"entered": False, "finished": False}
-
-    async def autocomplete_slow(request):
-        status["entered"] = True
-        await sleep(5)
-        status["finished"] = True
-        return web.Response(text="OK")
-
-    app = web.Application()
-    app.router.add_get("/autocomplete", autocomplete_slow)
-    darclient = await darclient_mock(aiohttp_client, app)
-    async with darclient:
-        result = await darclient.healthcheck(1)
+    async with AsyncDARClient() as adarclient:
+        with patch_get(adarclient, side_effect=TimeoutError()) as get:
+            result = await adarclient.healthcheck(1)
+            await adarclient.healthcheck(1)
     assert result is False
-    assert status["entered"] is True
-    assert status["finished"] is False
+    first, second = (call.kwargs["timeout"] for call in get.call_args_list)
+    assert first.total == 1
+    # The timeout override is only built once
+    assert second is first
 
 
-async def test_healthcheck_client_error(aiohttp_client, loop):
+async def test_healthcheck_client_error():
     # ClientError
-    status = {"entered": False}
+    async with AsyncDARClient() as adarclient:
+        with patch_get(adarclient, side_effect=ClientError("BOOM")):
+            result = await adarclient.healthcheck(1)
+    assert result is False
 
-    async def autocomplete_never(request):
-        status["entered"] = True
+
+async def test_healthcheck_cached():
+    # Successful healthchecks are cached
+    adarclient = AsyncDARClient()
+    async with adarclient:
+        with patch_get(adarclient) as get:
+            assert await adarclient.healthcheck() is True
+            assert await adarclient.healthcheck() is True
+    assert get.call_count == 1
+
+    # The cache is invalidated on close
+    async with adarclient:
+        with patch_get(adarclient) as get:
+            assert await adarclient.healthcheck() is True
+            # The cache expires after health_ttl
+            adarclient._health_ttl = 0
+            assert await adarclient.healthcheck() is True
+    assert get.call_count == 2
+
+
+async def test_healthcheck_non_200_not_cached():
+    # Failed healthchecks are not cached
+    async with AsyncDARClient() as adarclient:
+        with patch_get(adarclient, status=500) as get:
+            assert await adarclient.healthcheck() is False
+            assert await adarclient.healthcheck() is False
+    assert get.call_count == 2
+
+
+async def test_healthcheck_addrtypes(adarclient: AsyncDARClient):
+    async with adarclient:
+        assert await adarclient.healthcheck(addrtypes=list(AddressType)) is True
+    assert dar_requests == {
+        "/autocomplete": 1,
+        **{f"/{addrtype.value}": 1 for addrtype in AddressType},
+    }
+
+
+async def test_healthcheck_addrtypes_parallel(aiohttp_server):
+    # Probes run concurrently, so wall time stays below the sum of their delays
+    status = {"calls": 0}
+
+    async def slow(request):
+        status["calls"] += 1
+        await sleep(0.2)
         return web.Response(text="OK")
 
+    async def fail(request):
+        raise web.HTTPInternalServerError()
+
     app = web.Application()
-    app.router.add_get("/autocomplete", autocomplete_never)
-    darclient = await darclient_mock(aiohttp_client, app)
-    async with darclient:
-        darclient._get_session().get = MagicMock(  # type: ignore
-            side_effect=ClientError("BOOM")
-        )
-        result = await darclient.healthcheck(1)
-    assert result is False
-    assert status["entered"] is False
+    app.router.add_get("/autocomplete", slow)
+    for addrtype in AddressType:
+        app.router.add_get(f"/{addrtype.value}", slow)
+    adarclient = adarclient_mock(await aiohttp_server(app))
+    async with adarclient:
+        start = monotonic()
+        assert await adarclient.healthcheck(addrtypes=list(AddressType)) is True
+        assert monotonic() - start < 0.2 * (len(AddressType) + 1)
+        # Checks including addrtypes are not cached
+        assert await adarclient.healthcheck(addrtypes=[AddressType.ADDRESS]) is True
+    assert status["calls"] == len(AddressType) + 1 + 2
+
+    # A single failing probe fails the healthcheck
+    app = web.Application()
+    app.router.add_get("/autocomplete", slow)
+    app.router.add_get(f"/{AddressType.ADDRESS.value}", fail)
+    adarclient = adarclient_mock(await aiohttp_server(app))
+    async with adarclient:
+        assert await adarclient.healthcheck(addrtypes=[AddressType.ADDRESS]) is False
@@ -1,7 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+from typing import AsyncIterator
+
 import pytest
+import pytest_asyncio
 
 from .utils import assert_dar_response
 from .utils import dar_lookup
@@ -10,10 +13,17 @@ from .utils import dar_parameterize
 from os2mo_dar_client import AsyncDARClient
 
 
+@pytest_asyncio.fixture(scope="module", autouse=True)
+async def shared_session() -> AsyncIterator[None]:
+    """Reuse one connection pool to DAR across the integration tests."""
+    yield
+    await AsyncDARClient.aclose_shared_session()
+
+
 @pytest.mark.integrationtest
-async def test_healthcheck_async(loop):
+async def test_healthcheck_async():
     """Test healthcheck passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         result = await darclient.healthcheck()
     assert result is True
@@ -21,9 +31,9 @@ async def test_healthcheck_async(loop):
 
 @pytest.mark.integrationtest
 @pytest.mark.parametrize(*dar_parameterize)
-async def test_dar_fetch_single(uuid, expected, loop):
+async def test_dar_fetch_single(uuid, expected):
     """Test lookup of single entry passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         result = await darclient.fetch_single(uuid)
     assert_dar_response(result, expected)
@@ -31,9 +41,9 @@ async def test_dar_fetch_single(uuid, expected, loop):
 
 @pytest.mark.integrationtest
 @pytest.mark.parametrize("uuid", dar_non_existent)
-async def test_dar_fetch_single_non_existent(uuid, loop):
+async def test_dar_fetch_single_non_existent(uuid):
     """Test lookup of a single non-existent entry fails."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         with pytest.raises(ValueError) as excinfo:
             await darclient.fetch_single(uuid)
@@ -42,9 +52,9 @@ async def test_dar_fetch_single_non_existent(uuid, loop):
 
 @pytest.mark.integrationtest
 @pytest.mark.parametrize(*dar_parameterize)
-async def test_dar_fetch(uuid, expected, loop):
+async def test_dar_fetch(uuid, expected):
     """Test lookup of single entry using dar_fetch passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch({uuid})
     assert not missing
@@ -55,9 +65,9 @@ async def test_dar_fetch(uuid, expected, loop):
 
 @pytest.mark.integrationtest
 @pytest.mark.parametrize("uuid", dar_non_existent)
-async def test_dar_fetch_non_existent(uuid, loop):
+async def test_dar_fetch_non_existent(uuid):
     """Test lookup of single non-existent entry using dar_fetch fails."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch({uuid})
     assert len(missing) == 1
@@ -67,9 +77,9 @@ async def test_dar_fetch_non_existent(uuid, loop):
 
 
 @pytest.mark.integrationtest
-async def test_dar_fetch_zero(loop):
+async def test_dar_fetch_zero():
     """Test lookup of zero entries using dar_fetch passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch(set())
     assert len(missing) == 0
@@ -77,9 +87,9 @@ async def test_dar_fetch_zero(loop):
 
 
 @pytest.mark.integrationtest
-async def test_dar_fetch_multiple(loop):
+async def test_dar_fetch_multiple():
     """Test lookup of multiple entries using dar_fetch passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch(set(dar_lookup.keys()))
     assert not missing
@@ -90,9 +100,9 @@ async def test_dar_fetch_multiple(loop):
 
 
 @pytest.mark.integrationtest
-async def test_dar_fetch_multiple_chunked(loop):
+async def test_dar_fetch_multiple_chunked():
     """Test lookup of multiple entries using dar_fetch passes."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch(set(dar_lookup.keys()), chunk_size=1)
     assert not missing
@@ -103,9 +113,9 @@ async def test_dar_fetch_multiple_chunked(loop):
 
 
 @pytest.mark.integrationtest
-async def test_dar_fetch_multiple_non_existent(loop):
+async def test_dar_fetch_multiple_non_existent():
     """Test lookup of multiple non-existent entries using dar_fetch fails."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch(dar_non_existent)
     assert len(missing) == len(dar_non_existent)
@@ -115,9 +125,9 @@ async def test_dar_fetch_multiple_non_existent(loop):
 
 
 @pytest.mark.integrationtest
-async def test_dar_fetch_multiple_mixed_existence(loop):
+async def test_dar_fetch_multiple_mixed_existence():
     """Test lookup of multiple mixed-existent entries using dar_fetch."""
-    darclient = AsyncDARClient()
+    darclient = AsyncDARClient(share_session=True)
     async with darclient:
         results, missing = await darclient.fetch(
             set.union(dar_non_existent, set(dar_lookup.keys()))
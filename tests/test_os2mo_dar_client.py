@@ -1,8 +1,36 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+import sys
+from unittest.mock import MagicMock
+
+import pytest_asyncio
+
 from os2mo_dar_client import __version__
+from os2mo_dar_client import use_uvloop
 
 
 def test_version():
     assert __version__ == "0.2.1"
+
+
+def test_use_uvloop(monkeypatch):
+    uvloop = MagicMock()
+    set_event_loop_policy = MagicMock()
+    monkeypatch.setitem(sys.modules, "uvloop", uvloop)
+    monkeypatch.setattr(asyncio, "set_event_loop_policy", set_event_loop_policy)
+
+    use_uvloop()
+
+    set_event_loop_policy.assert_called_once_with(uvloop.EventLoopPolicy())
+
+
+@pytest_asyncio.fixture(scope="session")
+async def session_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+async def test_shared_event_loop(session_loop: asyncio.AbstractEventLoop) -> None:
+    """Test that tests run in the same event loop as session-scoped fixtures."""
+    assert asyncio.get_running_loop() is session_loop
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+from asyncio import new_event_loop
+
+from aiohttp import ClientSession
+
+from os2mo_dar_client import AsyncDARClient
+from os2mo_dar_client import DARClient
+
+
+def test_connector_limits():
+    darclient = DARClient(connector_limit=42, connector_limit_per_host=7)
+    with darclient:
+        connector = darclient._get_session().connector
+        assert connector is not None
+        assert connector.limit == 42
+        assert connector.limit_per_host == 7
+
+
+def test_shared_session():
+    darclient1 = DARClient(share_session=True)
+    darclient2 = DARClient(share_session=True)
+    darclient3 = DARClient()
+    with darclient1, darclient2, darclient3:
+        session = darclient1._get_session()
+        assert darclient2._get_session() is session
+        assert darclient3._get_session() is not session
+    assert not session.closed
+
+    with darclient1:
+        assert darclient1._get_session() is session
+
+    darclient1.aclose_shared_session()
+    assert session.closed
+    with darclient1:
+        assert darclient1._get_session() is not session
+    darclient1.aclose_shared_session()
+    # Closing without a shared session is a no-op
+    darclient1.aclose_shared_session()
+
+
+def test_shared_session_event_loops():
+    """Test that each event loop gets its own shared session."""
+
+    async def open_shared_session() -> ClientSession:
+        adarclient = AsyncDARClient(share_session=True)
+        async with adarclient:
+            session = adarclient._get_session()
+        return session
+
+    loop1 = new_event_loop()
+    loop2 = new_event_loop()
+    session1 = loop1.run_until_complete(open_shared_session())
+    session2 = loop2.run_until_complete(open_shared_session())
+    assert session2 is not session1
+    assert loop1.run_until_complete(open_shared_session()) is session1
+
+    # Sessions of closed event loops are forgotten
+    loop1.run_until_complete(session1.close())
+    loop1.close()
+    assert loop2.run_until_complete(open_shared_session()) is session2
+    assert loop1 not in AsyncDARClient._shared_sessions
+
+    loop2.run_until_complete(AsyncDARClient.aclose_shared_session())
+    assert session2.closed
+    loop2.close()
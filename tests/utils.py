@@ -1,11 +1,22 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections import Counter
+from functools import lru_cache
+from typing import AsyncIterator
+from typing import Optional
 from typing import Tuple
 from uuid import UUID
 
+import orjson
 import pytest
+import pytest_asyncio
+from aiohttp import ClientSession
+from aiohttp import ClientTimeout
+from aiohttp import TCPConnector
 from aiohttp import web
+from aiohttp.test_utils import TestServer
 from ra_utils.syncable import Syncable
 from tenacity import stop_after_delay
 
@@ -103,83 +114,151 @@ dar_cleanse_parameterize = (
 )
 dar_cleanse_unspecific_match = {"Flyvervej x, Svendborg", ""}
 
+# The mock DAR serves pre-serialized replies, keyed by (lowercased) request strings
+dar_lookup_json = {str(uuid): orjson.dumps(value) for uuid, value in dar_lookup.items()}
+
+
+def json_response(body: bytes) -> web.Response:
+    return web.Response(body=body, content_type="application/json")
+
 
 def assert_dar_response(result, expected):
     for key in expected.keys():
         assert result[key] == expected[key]
 
 
-async def darserver_mock() -> web.Application:
-    async def autocomplete(request):
-        return web.Response(text="OK")
-
-    async def cleanse_endpoint(request):
-        address_string = request.query.get("betegnelse")
-        if address_string not in dar_cleanse_lookup:
-            raise web.HTTPNotFound()
-        return web.json_response(dar_cleanse_lookup[address_string])
-
-    async def single_address_endpoint(request):
-        uuid = UUID(request.path.rsplit("/")[-1])
-        if uuid not in dar_lookup:
-            raise web.HTTPNotFound()
-        return web.json_response(dar_lookup[uuid])
-
-    async def address_endpoint(request):
-        uuids = request.query.get("id").split("|")
-        uuids = map(UUID, uuids)
-        uuids = filter(lambda uuid: uuid in dar_lookup, uuids)
-        result = map(lambda uuid: dar_lookup[uuid], uuids)
-        return web.json_response(list(result))
-
-    app = web.Application()
-    app.router.add_get("/autocomplete", autocomplete)
-    for addrtype in ALL_ADDRESS_TYPES:
-        app.router.add_get(f"/{addrtype.value}/" + "{uuid}", single_address_endpoint)
-        app.router.add_get(f"/{addrtype.value}", address_endpoint)
-
-        app.router.add_get(f"/datavask/{addrtype.value}", cleanse_endpoint)
+dar_routes = web.RouteTableDef()
+
+# Requests received by the mock DAR per path, cleared before every test
+dar_requests: Counter = Counter()
+
+
+@web.middleware
+async def count_requests(request, handler):
+    dar_requests[request.path] += 1
+    return await handler(request)
+
+
+@dar_routes.get("/autocomplete")
+async def autocomplete(request):
+    return web.Response(text="OK")
+
+
+async def cleanse_endpoint(request):
+    address_string = request.query.get("betegnelse")
+    if address_string not in dar_cleanse_lookup:
+        raise web.HTTPNotFound()
+    return json_response(orjson.dumps(dar_cleanse_lookup[address_string]))
+
+
+async def address_endpoint(request):
+    if "id" not in request.query:
+        per_side = int(request.query.get("per_side", len(dar_lookup)))
+        return json_response(
+            b"[" + b",".join(list(dar_lookup_json.values())[:per_side]) + b"]"
+        )
+    uuids = request.query["id"].lower().split("|")
+    lookup = dar_lookup_json.get
+    result = [address for address in map(lookup, uuids) if address is not None]
+    return json_response(b"[" + b",".join(result) + b"]")
+
+
+for addrtype in ALL_ADDRESS_TYPES:
+    dar_routes.get(f"/{addrtype.value}")(address_endpoint)
+    dar_routes.get(f"/datavask/{addrtype.value}")(cleanse_endpoint)
+
+
+@lru_cache(maxsize=1)
+def darserver_mock() -> web.Application:
+    app = web.Application(middlewares=[count_requests])
+    app.add_routes(dar_routes)
     return app
 
 
-@pytest.fixture
-async def darserver() -> web.Application:
-    return await darserver_mock()
+@pytest_asyncio.fixture(scope="session")
+async def darserver() -> AsyncIterator[TestServer]:
+    server = TestServer(darserver_mock())
+    await server.start_server()
+    yield server
+    await server.close()
 
 
-async def darclient_mocks(
-    aiohttp_client, darserver
-) -> Tuple[AsyncDARClient, DARClient]:
-    class TestAsyncDARClient(AsyncDARClient):
-        async def aopen(self) -> None:
-            self._session = await aiohttp_client(darserver, timeout=2)
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    """Run the tests on uvloop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
+
+
+@pytest.fixture(autouse=True)
+def reset_dar_requests() -> None:
+    dar_requests.clear()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def darconnector() -> AsyncIterator[TCPConnector]:
+    """Connection pool shared by all test clients, to reuse keep-alive connections."""
+    connector = TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+    yield connector
+    await connector.close()
 
-    class TestDARClient(Syncable, TestAsyncDARClient):
-        pass
 
+class TestAsyncDARClient(AsyncDARClient):
+    """AsyncDARClient connecting to the mock DAR server."""
+
+    _darserver: TestServer
+    _darconnector: Optional[TCPConnector] = None
+
+    async def aopen(self) -> None:
+        self._session = ClientSession(
+            base_url=self._darserver.make_url("/"),
+            timeout=ClientTimeout(total=2),
+            connector=self._darconnector,
+            connector_owner=self._darconnector is None,
+        )
+
+
+class TestDARClient(Syncable, TestAsyncDARClient):
+    pass
+
+
+def darclient_mocks(
+    darserver: TestServer, darconnector: Optional[TCPConnector] = None
+) -> Tuple[AsyncDARClient, DARClient]:
     adarclient = TestAsyncDARClient()
-    adarclient._baseurl = ""
     darclient = TestDARClient()
-    darclient._baseurl = ""
-    adarclient._fetch_single.retry.stop = stop_after_delay(0)  # type: ignore
+    for client in (adarclient, darclient):
+        client._darserver = darserver
+        client._darconnector = darconnector
+        client._baseurl = ""
+    adarclient._fetch_non_chunked.retry.stop = stop_after_delay(0)  # type: ignore
     return adarclient, darclient
 
 
-async def darclient_mock(aiohttp_client, darserver) -> DARClient:
-    _, darclient = await darclient_mocks(aiohttp_client, darserver)
+def darclient_mock(
+    darserver: TestServer, darconnector: Optional[TCPConnector] = None
+) -> DARClient:
+    _, darclient = darclient_mocks(darserver, darconnector)
     return darclient
 
 
-@pytest.fixture
-async def darclient(aiohttp_client, darserver) -> DARClient:
-    return await darclient_mock(aiohttp_client, darserver)
+@pytest_asyncio.fixture
+async def darclient(darserver: TestServer, darconnector: TCPConnector) -> DARClient:
+    return darclient_mock(darserver, darconnector)
 
 
-async def adarclient_mock(aiohttp_client, darserver) -> AsyncDARClient:
-    adarclient, _ = await darclient_mocks(aiohttp_client, darserver)
+def adarclient_mock(
+    darserver: TestServer, darconnector: Optional[TCPConnector] = None
+) -> AsyncDARClient:
+    adarclient, _ = darclient_mocks(darserver, darconnector)
     return adarclient
 
 
-@pytest.fixture
-async def adarclient(aiohttp_client, darserver) -> AsyncDARClient:
-    return await adarclient_mock(aiohttp_client, darserver)
+@pytest_asyncio.fixture
+async def adarclient(
+    darserver: TestServer, darconnector: TCPConnector
+) -> AsyncDARClient:
+    return adarclient_mock(darserver, darconnector)